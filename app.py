@@ -0,0 +1,31 @@
+import os
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+def create_app():
+    """Create the Flask app and make sure the database tables exist"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'microgrid-secret')
+    # Postgres in production, a local SQLite file otherwise
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL',
+                                                           'sqlite:///microgrid.db')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+    }
+    db.init_app(app)
+
+    with app.app_context():
+        import models  # noqa: F401
+        db.create_all()
+
+    return app
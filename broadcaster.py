@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+METRICS = ('voltage', 'frequency', 'predicted_voltage', 'predicted_frequency')
+LABELS = ('voltage_action', 'frequency_action')
+DEFAULT_INTERVAL = 1.0  # Seconds between batches sent to a client
+MIN_INTERVAL = 0.1
+MAX_INTERVAL = 60.0
+
+
+class _Room:
+    """Clients sharing one subscription, and what they have been sent"""
+
+    def __init__(self, name, nodes, metrics, interval):
+        self.name = name
+        self.nodes = nodes
+        self.metrics = metrics
+        self.interval = interval
+        self.members = set()
+        self.next_due = 0.0
+        self.last_seq = -1
+        self.labels = {}  # Last label per (name, node) sent to this room
+
+
+class Broadcaster:
+    """Throttled, coalescing fan-out of control loop updates to Socket.IO clients
+
+    The loop publishes every tick into a short shared history. Clients
+    subscribe to a set of nodes and metrics at an update interval, and all
+    clients with the same subscription share a Socket.IO room. When a room
+    is due, every tick published since its last batch is packed into one
+    'update_batch' message: float32 values shaped (ticks, metrics, nodes),
+    timestamps as float32 offsets from a shared base, and only the action
+    labels that changed. Serialization therefore happens once per room
+    rather than once per client and tick.
+    """
+
+    def __init__(self, socketio, n_nodes=1, history=600):
+        self.socketio = socketio
+        self.n_nodes = n_nodes
+        self.history = deque(maxlen=history)  # (seq, timestamp, values, labels)
+        self.seq = 0
+        self.rooms = {}
+        self.clients = {}  # sid -> room name
+        self.lock = threading.Lock()
+
+    def normalize(self, nodes=None, metrics=None, interval=None):
+        """Validate a subscription, returning (nodes, metrics, interval)"""
+        nodes = sorted({int(n) for n in nodes}) if nodes else [0]
+        if any(n < 0 or n >= self.n_nodes for n in nodes):
+            raise ValueError(f'nodes must be in [0, {self.n_nodes})')
+        metrics = [m for m in METRICS if m in metrics] if metrics else list(METRICS)
+        if not metrics:
+            raise ValueError(f'metrics must be among {METRICS}')
+        interval = min(max(float(interval or DEFAULT_INTERVAL), MIN_INTERVAL), MAX_INTERVAL)
+        return nodes, metrics, interval
+
+    def subscribe(self, sid, nodes=None, metrics=None, interval=None):
+        """Move a client into the room for its (nodes, metrics, interval)"""
+        nodes, metrics, interval = self.normalize(nodes, metrics, interval)
+        name = 'stream:{}:{}:{:g}'.format(','.join(map(str, nodes)),
+                                          ','.join(str(METRICS.index(m)) for m in metrics),
+                                          interval)
+        with self.lock:
+            self._leave(sid)
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = _Room(name, nodes, metrics, interval)
+                # Start from the latest tick so the first batch is not empty
+                room.last_seq = max(self.seq - 2, -1)
+            # Resend every label on the next batch so the newcomer has them all
+            room.labels.clear()
+            room.members.add(sid)
+            self.clients[sid] = name
+        self.socketio.server.enter_room(sid, name, namespace='/')
+        return room
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            name = self._leave(sid)
+        if name is not None:
+            self.socketio.server.leave_room(sid, name, namespace='/')
+
+    def _leave(self, sid):
+        name = self.clients.pop(sid, None)
+        if name is not None:
+            room = self.rooms[name]
+            room.members.discard(sid)
+            if not room.members:
+                del self.rooms[name]
+        return name
+
+    def publish(self, timestamp, values, labels=None):
+        """Record one tick; values maps metric -> per-node values"""
+        # numpy is imported here so the web process can start without it
+        import numpy as np
+
+        row = np.empty((len(METRICS), self.n_nodes), dtype=np.float32)
+        for i, metric in enumerate(METRICS):
+            row[i] = values[metric]
+        with self.lock:
+            self.history.append((self.seq, timestamp, row, labels or {}))
+            self.seq += 1
+
+    def publish_update(self, update):
+        """Record a single-node update dict as produced by main.process_tick"""
+        self.publish(update['timestamp'],
+                     {metric: update[metric] for metric in METRICS},
+                     {label: [update[label]] for label in LABELS})
+
+    def flush(self, now=None):
+        """Send a batch to every room whose interval has elapsed"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            batches = []
+            for room in self.rooms.values():
+                if now < room.next_due or room.last_seq >= self.seq - 1:
+                    continue
+                room.next_due = now + room.interval
+                batches.append((room.name, self._pack(room)))
+        for name, payload in batches:
+            self.socketio.emit('update_batch', payload, to=name)
+        return len(batches)
+
+    def _pack(self, room):
+        import numpy as np
+
+        ticks = [entry for entry in self.history if entry[0] > room.last_seq]
+        room.last_seq = ticks[-1][0]
+
+        timestamps = np.array([entry[1] for entry in ticks])
+        metric_index = [METRICS.index(m) for m in room.metrics]
+        values = np.stack([entry[2] for entry in ticks])[:, metric_index][:, :, room.nodes]
+
+        # Labels are coalesced to their latest value and sent only on change
+        changed = {}
+        for name, per_node in ticks[-1][3].items():
+            for node in room.nodes:
+                label = per_node[node]
+                if room.labels.get((name, node)) != label:
+                    room.labels[(name, node)] = label
+                    changed.setdefault(name, {})[str(node)] = label
+
+        return {
+            'seq': room.last_seq,
+            'nodes': room.nodes,
+            'metrics': room.metrics,
+            't0': float(timestamps[0]),
+            'dt': (timestamps - timestamps[0]).astype(np.float32).tobytes(),
+            'values': np.ascontiguousarray(values).tobytes(),
+            'labels': changed,
+        }
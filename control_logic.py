@@ -1,10 +1,48 @@
+from enum import IntEnum
+
+# Adaptive stabilization tuning, shared by the control loop and the
+# multi-node simulator
+STABILITY_GAIN_RATE = 0.02  # How fast system learns stability
+STABILITY_LOSS_RATE = 0.2  # How much stability is lost on destabilization
+PERFECT_MODE_THRESHOLD = 0.8  # Threshold for perfect mode transition
+CORRECTION_RATE = 0.4  # Share of the deviation corrected per cycle
+CORRECTION_GAIN = 2.0  # Offset change applied per unit of correction
+DESTABILIZE_HOLDOFF = 10  # Seconds without learning after a destabilization
+
+
+class ControlAction(IntEnum):
+    """Compact action codes produced by the vectorized classifiers"""
+    NONE = 0
+    INCREASE = 1
+    DECREASE = 2
+
+
+ACTION_LABELS = {
+    'voltage': ('No Action Needed', 'Increase Volt', 'Decrease Volt'),
+    'frequency': ('No Action Needed', 'Increase Freq', 'Decrease Freq'),
+}
+DEVIATION_FORMATS = {'voltage': '{:.1f}V', 'frequency': '{:.2f}Hz'}
+
 class ControlLogic:
 
-    def __init__(self):
-        self.nominal_voltage = 230
-        self.nominal_frequency = 50
-        self.voltage_tolerance = 5
-        self.frequency_tolerance = 0.5
+    def __init__(self, config=None):
+        """Use thresholds from a SystemConfig row, or the defaults without one"""
+        self.nominal_voltage = config.nominal_voltage if config else 230
+        self.nominal_frequency = config.nominal_frequency if config else 50
+        self.voltage_tolerance = config.voltage_tolerance if config else 5
+        self.frequency_tolerance = config.frequency_tolerance if config else 0.5
+
+    @classmethod
+    def from_system_config(cls):
+        """Build from the most recent SystemConfig (needs an app context)"""
+        from app import db
+        from models import SystemConfig
+
+        config = db.session.execute(
+            db.select(SystemConfig)
+            .order_by(SystemConfig.last_updated.desc())
+            .limit(1)).scalar()
+        return cls(config)
 
     def get_voltage_action(self, predicted_voltage):
         """Determine control action for voltage"""
@@ -21,3 +59,45 @@ class ControlLogic:
         elif predicted_frequency < self.nominal_frequency - self.frequency_tolerance:
             return "Increase Freq"
         return "No Action Needed"
+
+    @staticmethod
+    def _classify(predicted, nominal, tolerance):
+        # numpy is imported here so importing this module stays cheap for
+        # the web process
+        import numpy as np
+
+        predicted = np.asarray(predicted, dtype=np.float64)
+        codes = (predicted < nominal - tolerance).astype(np.int8)
+        codes[predicted > nominal + tolerance] = ControlAction.DECREASE
+        return codes, nominal - predicted
+
+    def get_voltage_actions(self, predicted_voltages):
+        """Classify an array of predicted voltages in one pass
+
+        Returns ControlAction codes (int8) and the deviation from nominal,
+        positive when the voltage needs to be increased.
+        """
+        return self._classify(predicted_voltages, self.nominal_voltage,
+                              self.voltage_tolerance)
+
+    def get_frequency_actions(self, predicted_frequencies):
+        """Classify an array of predicted frequencies in one pass"""
+        return self._classify(predicted_frequencies, self.nominal_frequency,
+                              self.frequency_tolerance)
+
+    @staticmethod
+    def render_actions(codes, quantity, deviations=None):
+        """Turn action codes into the strings shown to clients
+
+        Meant to be called only where results leave the process. With
+        deviations, actions are annotated with their magnitude, e.g.
+        'Increase Volt (6.2V)'.
+        """
+        labels = ACTION_LABELS[quantity]
+        if deviations is None:
+            return [labels[code] for code in codes]
+
+        magnitude = DEVIATION_FORMATS[quantity]
+        return [labels[code] if code == ControlAction.NONE else
+                f'{labels[code]} ({magnitude.format(abs(deviation))})'
+                for code, deviation in zip(codes.tolist(), deviations.tolist())]
@@ -0,0 +1,124 @@
+import logging
+import math
+import queue
+from control_logic import STABILITY_LOSS_RATE
+
+RESUME_DELAY = 3.0  # Seconds stabilization pauses after a manual adjustment
+RESET_STEPS = 10  # Steps in which offsets are eased back to zero
+RESET_STEP_INTERVAL = 0.3  # Seconds between reset steps
+
+
+class ControlState:
+    """Operator-controlled state of the control loop
+
+    Owned by the simulation worker: only the control loop thread reads or
+    changes it. Socket handlers never touch it directly but send commands,
+    which the loop applies at the start of each tick. The delayed effects
+    that used to run as background tasks (resuming stabilization after a
+    manual adjustment, easing offsets back to zero) are timers advanced by
+    the loop on its clock.
+    """
+
+    def __init__(self):
+        self.voltage_offset = 0.0
+        self.frequency_offset = 0.0
+        self.auto_stabilize = True
+        self.stabilize_enabled = True  # Flag to control continuous stabilization
+        self.perfect_stabilization = False  # Standard vs perfect stabilization
+        self.stabilization_quality = 0.0  # Track stabilization improvement (0 to 1)
+        self.last_destabilize_time = 0.0  # Track when system was last destabilized
+
+        self.resume_at = None  # When stabilization is re-enabled
+        self.reset = None  # (start time, voltage step, frequency step, steps done)
+
+    def apply(self, command, data, now):
+        handler = getattr(self, f'_on_{command}', None)
+        if handler is None:
+            logging.warning(f'Ignoring unknown control command {command!r}')
+            return
+        handler(data, now)
+
+    def _on_manual_adjustment(self, data, now):
+        if data['type'] == 'voltage':
+            self.voltage_offset = data['value']
+        else:
+            self.frequency_offset = data['value']
+        self.auto_stabilize = data['auto_stabilize']
+
+        # Pause stabilization for 3 seconds when manual adjustment is made
+        # to allow the user to see the effect of their change
+        self.stabilize_enabled = False
+        self.reset = None
+        self.resume_at = now + RESUME_DELAY if self.auto_stabilize else None
+        logging.debug(f'Manual adjustment: {data}, temporarily pausing stabilization')
+
+    def _on_set_auto_stabilize(self, data, now):
+        self.auto_stabilize = data['enabled']
+        self.stabilize_enabled = True  # Always enable stabilization when toggling
+        self.resume_at = None
+
+        # Clear any manual offsets when auto-stabilize is enabled
+        if self.auto_stabilize:
+            self.reset = (now, self.voltage_offset / RESET_STEPS,
+                          self.frequency_offset / RESET_STEPS, 0)
+        else:
+            self.reset = None
+        logging.debug(f'Auto-stabilize set to: {self.auto_stabilize}')
+
+    def _on_set_stabilization_mode(self, data, now):
+        self.perfect_stabilization = data['perfect_mode']
+
+        if data.get('destabilize', False):
+            # Reset learning progress on destabilization
+            self.stabilization_quality *= (1 - STABILITY_LOSS_RATE)
+            self.last_destabilize_time = now
+            logging.debug(f'System destabilized, stability reduced to {self.stabilization_quality}')
+
+            # Force disable auto-stabilization if manual mode is requested
+            if data.get('force_manual', False):
+                self.auto_stabilize = False
+                self.stabilize_enabled = False
+                self.resume_at = None
+                self.reset = None
+                logging.debug('Forced manual control mode')
+
+        logging.debug(f'Perfect stabilization mode set to: {self.perfect_stabilization}, '
+                      f'quality: {self.stabilization_quality}')
+
+    def advance(self, now):
+        """Run the timers that are due"""
+        if self.resume_at is not None and now >= self.resume_at:
+            self.resume_at = None
+            self.stabilize_enabled = True
+            logging.debug('Stabilization resumed')
+
+        if self.reset is not None:
+            start, voltage_step, frequency_step, done = self.reset
+            due = min(RESET_STEPS, math.floor((now - start) / RESET_STEP_INTERVAL) + 1)
+            self.voltage_offset -= voltage_step * (due - done)
+            self.frequency_offset -= frequency_step * (due - done)
+            if due < RESET_STEPS:
+                self.reset = (start, voltage_step, frequency_step, due)
+            else:
+                # Final reset to ensure precision
+                self.reset = None
+                self.voltage_offset = 0.0
+                self.frequency_offset = 0.0
+
+
+class CommandQueue:
+    """Commands waiting for the control loop, in the order they were sent"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, command, data):
+        self.queue.put((command, data))
+
+    def drain(self):
+        """Yield every (command, data) queued so far without blocking"""
+        while True:
+            try:
+                yield self.queue.get_nowait()
+            except queue.Empty:
+                return
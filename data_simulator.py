@@ -1,13 +1,14 @@
 
 from grid_dataset import GridDataset
+from ring_buffer import RingBuffer
 import numpy as np
 
 class DataSimulator:
-    def __init__(self):
-        self.dataset = GridDataset()
+    def __init__(self, clock=None):
+        self.dataset = GridDataset(clock=clock)
         self.current_scenario = 'normal'
-        self.stability_history = []
         self.max_history = 100
+        self.stability_history = RingBuffer(self.max_history)
         
     def generate_data_point(self):
         """Generate a single data point with stability tracking"""
@@ -19,13 +20,25 @@ class DataSimulator:
         
         stability_score = 1.0 - (voltage_deviation / 15 + freq_deviation)
         self.stability_history.append(stability_score)
-        if len(self.stability_history) > self.max_history:
-            self.stability_history.pop(0)
             
         return voltage, frequency
         
+    def generate_batch(self, n, **kwargs):
+        """Generate n data points at once without touching the live history
+
+        Accepts the same keyword arguments as GridDataset.generate_batch and
+        returns (voltage, frequency, scenario, stability_score) arrays.
+        """
+        voltage, frequency, scenario = self.dataset.generate_batch(n, **kwargs)
+
+        voltage_deviation = np.abs(voltage - self.dataset.nominal_voltage)
+        freq_deviation = np.abs(frequency - self.dataset.nominal_frequency)
+
+        stability_score = 1.0 - (voltage_deviation / 15 + freq_deviation)
+        return voltage, frequency, scenario, stability_score
+
     def get_stability_trend(self):
         """Calculate stability trend over time"""
         if len(self.stability_history) < 2:
             return 0
-        return np.mean(np.diff(self.stability_history[-10:]))
+        return self.stability_history.trend(10)
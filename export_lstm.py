@@ -0,0 +1,75 @@
+import argparse
+import logging
+import torch
+import torch.nn as nn
+from lstm_model import (LSTMPredictor, save_checkpoint, SCRIPTED_TYPE,
+                        QUANTIZED_TYPE)
+
+# Largest accepted deviation from the eager model, in normalized units
+SCRIPTED_TOLERANCE = 1e-5
+QUANTIZED_TOLERANCE = 0.05
+
+
+def script_model(model):
+    """Compile an eager LSTM to TorchScript"""
+    return torch.jit.script(model.eval())
+
+
+def quantize_model(model):
+    """Dynamically int8-quantize the LSTM and linear layers, then compile"""
+    quantized = torch.ao.quantization.quantize_dynamic(model.eval(),
+                                                       {nn.LSTM, nn.Linear},
+                                                       dtype=torch.qint8)
+    return torch.jit.script(quantized)
+
+
+def check_parity(reference, candidate, sequence_length=10, batch_size=64, seed=0):
+    """Largest absolute difference between two models on random windows
+
+    Compares both the windowed forward pass and the streaming step path.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.randn(batch_size, sequence_length, 1, generator=generator)
+
+    with torch.inference_mode():
+        error = (reference(x) - candidate(x)).abs().max().item()
+
+        reference_state, candidate_state = None, None
+        for t in range(sequence_length):
+            expected, reference_state = reference.step(x[:, t:t + 1], reference_state)
+            actual, candidate_state = candidate.step(x[:, t:t + 1], candidate_state)
+            error = max(error, (expected - actual).abs().max().item())
+    return error
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the trained LSTM to TorchScript')
+    parser.add_argument('--quantize', action='store_true',
+                        help='apply dynamic int8 quantization before compiling')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from app import create_app
+    with create_app().app_context():
+        predictor = LSTMPredictor()
+        record = predictor.load_best_checkpoint(prefer_exported=False)
+        if record is None:
+            raise SystemExit('No trained checkpoint to export, run train_lstm.py first')
+
+        if args.quantize:
+            exported, parameter_type, tolerance = (quantize_model(predictor.model),
+                                                   QUANTIZED_TYPE, QUANTIZED_TOLERANCE)
+        else:
+            exported, parameter_type, tolerance = (script_model(predictor.model),
+                                                   SCRIPTED_TYPE, SCRIPTED_TOLERANCE)
+
+        error = check_parity(predictor.model, exported)
+        logging.info(f'Parity with eager model: max abs error {error:.2e}')
+        if error > tolerance:
+            raise SystemExit(f'Exported model deviates by {error:.2e} '
+                             f'(tolerance {tolerance:.0e}), not saving')
+
+        # Keep the source checkpoint's validation RMSE with the artifact
+        saved = save_checkpoint(exported, record.performance_metric, parameter_type)
+        logging.info(f'Saved {parameter_type} checkpoint {saved.id}')
@@ -1,17 +1,19 @@
 import numpy as np
-import pandas as pd
-from datetime import datetime
 import math
+from replay_store import ReplayStore
+from sim_clock import WallClock
+
+DATA_PATH = 'Data/Apr_2023.csv'
 
 
 class GridDataset:
 
-    def __init__(self):
+    def __init__(self, data_path=DATA_PATH, clock=None):
+        self.clock = clock or WallClock()
         self.nominal_voltage = 230
         self.nominal_frequency = 50
-        self.data = pd.read_csv('Data/Apr_2023.csv',
-                                parse_dates=True,
-                                nrows=1_00_000)
+        # Recorded month, memory-mapped from its columnar cache
+        self.replay = ReplayStore(data_path)
 
         self.scenarios = {
             'normal': {
@@ -46,22 +48,19 @@ class GridDataset:
             }
         }
 
-        self.hour = datetime.now().hour
-        self.last_event_time = datetime.now()
+        self.hour = self.clock.now().hour
+        self.last_event_time = self.clock.now()
         self.current_scenario = 'normal'
         self.event_duration = 0
         self.weight = 0.001
 
     def row_generator(self):
-        idx = 0
-        length = len(self.data)
         while True:
-            yield self.data.iloc[idx]
-            idx = (idx + 1) % length
+            yield self.replay.next_row()
 
     def _apply_time_patterns(self, value, is_voltage=True):
         """Apply realistic time-based patterns to values"""
-        hour = datetime.now().hour
+        hour = self.clock.now().hour
 
         # Daily load curve effect (24-hour pattern)
         time_factor = math.sin(2 * math.pi * (hour - 6) / 24)  # Peak at 12-14h
@@ -76,17 +75,14 @@ class GridDataset:
     def _apply_weather_impact(self):
         """Simulate weather impacts on grid stability"""
         # Simple weather pattern simulation
-        hour = datetime.now().hour
+        hour = self.clock.now().hour
         weather_impact = math.sin(2 * math.pi * hour / 12) * 0.5
         return weather_impact
 
-    def _get_current_scenario(self):
-        if (datetime.now() -
-                self.last_event_time).seconds < self.event_duration:
-            return self.current_scenario
-
+    def _scenario_probabilities(self, hour):
+        """Scenario probabilities for a given hour, ordered like self.scenarios"""
         # Time-based probabilities
-        if 9 <= self.hour <= 17:  # Business hours
+        if 9 <= hour <= 17:  # Business hours
             scenario_weights = {
                 'normal': 0.55,
                 'peak_load': 0.25,
@@ -94,7 +90,7 @@ class GridDataset:
                 'fault': 0.05,
                 'weather_impact': 0.05
             }
-        elif 0 <= self.hour <= 5:  # Night hours
+        elif 0 <= hour <= 5:  # Night hours
             scenario_weights = {
                 'normal': 0.8,
                 'peak_load': 0.05,
@@ -108,15 +104,22 @@ class GridDataset:
                 for s in self.scenarios
             }
 
-        scenarios = list(scenario_weights.keys())
-        probabilities = list(scenario_weights.values())
-
         # Ensure probabilities sum to 1
-        probabilities = np.array(probabilities)
-        probabilities = probabilities / probabilities.sum()
+        probabilities = np.array([scenario_weights[s] for s in self.scenarios])
+        return probabilities / probabilities.sum()
+
+    def _get_current_scenario(self):
+        now = self.clock.now()
+        if (now - self.last_event_time).seconds < self.event_duration:
+            return self.current_scenario
+
+        # Follow the clock so long simulated runs see every hour of the day
+        self.hour = now.hour
+        scenarios = list(self.scenarios)
+        probabilities = self._scenario_probabilities(self.hour)
 
         self.current_scenario = np.random.choice(scenarios, p=probabilities)
-        self.last_event_time = datetime.now()
+        self.last_event_time = now
         self.event_duration = self.scenarios[
             self.current_scenario]['recovery_time']
 
@@ -124,9 +127,7 @@ class GridDataset:
 
     def generate_data_point(self):
         """Generate a realistic data point with various factors"""
-        getrow = next(self.row_generator())
-        baseline_voltage = getrow['MG-LV-MSB_AC_Voltage']
-        baseline_frequency = getrow['MG-LV-MSB_Frequency']
+        baseline_voltage, baseline_frequency = self.replay.next_row()
 
         scenario = self._get_current_scenario()
         scenario_params = self.scenarios[scenario]
@@ -155,3 +156,103 @@ class GridDataset:
                             self.nominal_frequency + 1)
 
         return voltage, frequency, scenario
+
+    def _simulate_scenarios(self, n, dt, start_seconds, rng):
+        """Scenario codes for n samples taken every dt seconds of virtual time
+
+        A scenario holds for its recovery_time before the next one is drawn,
+        as in _get_current_scenario. Scenario weights only change on the
+        hour, so each hour is filled with a single vectorized draw.
+        """
+        durations = np.array(
+            [self.scenarios[s]['recovery_time'] for s in self.scenarios])
+        segment_lengths = np.maximum(1, np.ceil(durations / dt)).astype(np.int64)
+        codes = np.empty(n, dtype=np.int8)
+
+        pos = 0
+        while pos < n:
+            elapsed = start_seconds + pos * dt
+            hour = int(elapsed // 3600) % 24
+            next_hour = (elapsed // 3600 + 1) * 3600 - start_seconds
+            block_end = min(n, max(pos + 1, math.ceil(next_hour / dt)))
+            probabilities = self._scenario_probabilities(hour)
+
+            # Draw enough segments to cover the rest of this hour
+            mean_length = (probabilities * segment_lengths).sum()
+            count = int((block_end - pos) / mean_length * 1.2) + 8
+            choices = rng.choice(len(durations), size=count, p=probabilities)
+            lengths = segment_lengths[choices]
+            ends = pos + np.cumsum(lengths)
+            used = min(count, int(np.searchsorted(ends, block_end)) + 1)
+
+            stop = min(n, int(ends[used - 1]))
+            codes[pos:stop] = np.repeat(choices[:used],
+                                        lengths[:used])[:stop - pos]
+            pos = stop
+
+        return codes
+
+    def sample_values(self, scenario, hours, rows, rng):
+        """Vectorized counterpart of generate_data_point
+
+        Produces one voltage and frequency per element of the scenario
+        codes array, given the local hour (array or scalar) and the replay
+        rows providing the baselines.
+        """
+        n = len(scenario)
+        voltage_var = np.array(
+            [self.scenarios[s]['voltage_var'] for s in self.scenarios])
+        freq_var = np.array(
+            [self.scenarios[s]['freq_var'] for s in self.scenarios])
+
+        baseline_voltage = self.replay.column('MG-LV-MSB_AC_Voltage')[rows]
+        baseline_frequency = self.replay.column('MG-LV-MSB_Frequency')[rows]
+
+        # Base value generation
+        voltage = rng.standard_normal(n)
+        voltage *= voltage_var[scenario]
+        voltage += self.nominal_voltage
+        voltage += baseline_voltage * self.weight
+        frequency = rng.standard_normal(n)
+        frequency *= freq_var[scenario]
+        frequency += self.nominal_frequency
+        frequency += baseline_frequency * self.weight
+
+        # Time patterns and weather effects only depend on the hour
+        hour_range = np.arange(24)
+        time_factor = np.sin(2 * np.pi * (hour_range - 6) / 24)[hours]
+        weather_effect = (np.sin(2 * np.pi * hour_range / 12) * 0.5)[hours]
+        voltage -= time_factor * 2.5
+        voltage += weather_effect
+        frequency += time_factor * 0.15
+        frequency += weather_effect * 0.1
+
+        # Apply constraints
+        np.clip(voltage, self.nominal_voltage - 15, self.nominal_voltage + 15,
+                out=voltage)
+        np.clip(frequency, self.nominal_frequency - 1,
+                self.nominal_frequency + 1, out=frequency)
+
+        return voltage, frequency
+
+    def generate_batch(self, n, start_time=None, dt=1.0, start_row=0, seed=None):
+        """Generate n data points in a single vectorized pass
+
+        Samples are spaced dt seconds apart on a virtual clock starting at
+        start_time, and baseline rows are replayed from start_row. The live
+        generator state is left untouched. Returns (voltage, frequency,
+        scenario) arrays, where scenario holds indices into
+        list(self.scenarios).
+        """
+        rng = np.random.default_rng(seed)
+        start_time = start_time or self.clock.now()
+        start_seconds = (start_time.hour * 3600 + start_time.minute * 60 +
+                         start_time.second + start_time.microsecond / 1e6)
+
+        scenario = self._simulate_scenarios(n, dt, start_seconds, rng)
+        hours = ((start_seconds + np.arange(n) * dt) // 3600).astype(
+            np.int64) % 24
+
+        rows = (start_row + np.arange(n)) % len(self.replay)
+        voltage, frequency = self.sample_values(scenario, hours, rows, rng)
+        return voltage, frequency, scenario
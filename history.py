@@ -0,0 +1,278 @@
+import math
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, jsonify, request
+from sqlalchemy import BigInteger, cast, func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import MeasurementRecord, MeasurementRollup
+
+# Bucket widths (seconds) for which aggregates are cached in MeasurementRollup
+ROLLUP_RESOLUTIONS = (60, 900, 3600)
+DEFAULT_POINTS = 2000
+MAX_POINTS = 10_000
+DEFAULT_RANGE = timedelta(hours=1)
+# Largest number of raw rows LTTB will scan before falling back to bucket means
+LTTB_RAW_LIMIT = 200_000
+
+EPOCH = datetime(1970, 1, 1)
+SERIES = ('voltage', 'frequency')
+
+history_api = Blueprint('history_api', __name__, url_prefix='/api')
+
+
+def _to_epoch(timestamp):
+    return (timestamp - EPOCH).total_seconds()
+
+
+def _from_epoch(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _floor(timestamp, width):
+    return _from_epoch(math.floor(_to_epoch(timestamp) / width) * width)
+
+
+def _bucket(column, width):
+    """SQL expression numbering the width-second bucket a naive UTC timestamp falls in"""
+    if db.engine.dialect.name == 'sqlite':
+        seconds = cast(func.strftime('%s', column), BigInteger)
+    else:
+        seconds = cast(func.floor(func.extract('epoch', column)), BigInteger)
+    # Floor division keeps the bucket number integral on every backend
+    return seconds // width
+
+
+def _aggregate_raw(start, end, width):
+    """Min/max/mean of raw measurements in [start, end), keyed by bucket index"""
+    record = MeasurementRecord
+    bucket = _bucket(record.timestamp, width).label('bucket')
+    query = (db.select(bucket, func.count(),
+                       func.min(record.voltage), func.max(record.voltage),
+                       func.avg(record.voltage),
+                       func.min(record.frequency), func.max(record.frequency),
+                       func.avg(record.frequency))
+             .where(record.timestamp >= start, record.timestamp < end)
+             .group_by(bucket))
+    return {int(row[0]): tuple(row[1:]) for row in db.session.execute(query)}
+
+
+def _aggregate_rollups(resolution, start, end, width):
+    """Re-bucket cached rollups of one resolution into width-second buckets"""
+    rollup = MeasurementRollup
+    bucket = _bucket(rollup.bucket_start, width).label('bucket')
+    count = func.sum(rollup.count)
+    query = (db.select(bucket, count,
+                       func.min(rollup.voltage_min), func.max(rollup.voltage_max),
+                       func.sum(rollup.voltage_mean * rollup.count) / count,
+                       func.min(rollup.frequency_min), func.max(rollup.frequency_max),
+                       func.sum(rollup.frequency_mean * rollup.count) / count)
+             .where(rollup.resolution == resolution,
+                    rollup.bucket_start >= start,
+                    rollup.bucket_start < end)
+             .group_by(bucket))
+    return {int(row[0]): tuple(row[1:]) for row in db.session.execute(query)}
+
+
+def _latest_timestamp():
+    return db.session.scalar(db.select(func.max(MeasurementRecord.timestamp)))
+
+
+def ensure_rollups(resolution, start, end):
+    """Compute and cache missing rollups for the closed buckets in [start, end)
+
+    A bucket is closed once a later measurement exists, since the control
+    loop writes in time order. Each resolution keeps one contiguous covered
+    span, so only the parts of the range outside it are aggregated.
+    """
+    latest = _latest_timestamp()
+    if latest is None:
+        return
+    low = _floor(start, resolution)
+    high = min(_floor(end, resolution) + timedelta(seconds=resolution),
+               _floor(latest, resolution))
+    if low >= high:
+        return
+
+    rollup = MeasurementRollup
+    covered_low, covered_high = db.session.execute(
+        db.select(func.min(rollup.bucket_start), func.max(rollup.bucket_start))
+        .where(rollup.resolution == resolution)).one()
+    if covered_low is None:
+        gaps = [(low, high)]
+    else:
+        covered_high += timedelta(seconds=resolution)
+        gaps = [(low, min(high, covered_low)), (max(low, covered_high), high)]
+
+    rows = []
+    for gap_start, gap_end in gaps:
+        if gap_start >= gap_end:
+            continue
+        for bucket, values in _aggregate_raw(gap_start, gap_end, resolution).items():
+            rows.append(dict(zip(
+                ('count', 'voltage_min', 'voltage_max', 'voltage_mean',
+                 'frequency_min', 'frequency_max', 'frequency_mean'), values),
+                resolution=resolution,
+                bucket_start=_from_epoch(bucket * resolution)))
+    if not rows:
+        return
+
+    try:
+        db.session.execute(db.insert(MeasurementRollup), rows)
+        db.session.commit()
+    except IntegrityError:
+        # Another request cached the same buckets first
+        db.session.rollback()
+
+
+def _merge(target, buckets):
+    """Fold one set of bucket aggregates into another"""
+    for key, values in buckets.items():
+        if key not in target:
+            target[key] = values
+            continue
+        a, b = target[key], values
+        count = a[0] + b[0]
+        target[key] = (count,
+                       min(a[1], b[1]), max(a[2], b[2]),
+                       (a[3] * a[0] + b[3] * b[0]) / count,
+                       min(a[4], b[4]), max(a[5], b[5]),
+                       (a[6] * a[0] + b[6] * b[0]) / count)
+
+
+def downsample(start, end, points=DEFAULT_POINTS):
+    """Min/max/mean buckets covering [start, end) in at most ~points buckets
+
+    Wide buckets are served from cached rollups, with only the still-open
+    tail aggregated from raw rows. Returns (bucket width, source, buckets).
+    """
+    width = max(1, math.ceil((end - start).total_seconds() / points))
+    resolution = max((r for r in ROLLUP_RESOLUTIONS if r <= width), default=None)
+    if resolution is None:
+        return width, 'raw', _aggregate_raw(start, end, width)
+
+    # Rollup buckets must nest exactly inside the requested ones
+    width = math.ceil(width / resolution) * resolution
+    ensure_rollups(resolution, start, end)
+
+    latest = _latest_timestamp()
+    closed = max(start, _floor(latest, resolution)) if latest else start
+    buckets = _aggregate_rollups(resolution, _floor(start, resolution),
+                                 min(end, closed), width)
+    if closed < end:
+        _merge(buckets, _aggregate_raw(closed, end, width))
+    return width, f'rollup_{resolution}', buckets
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of `threshold` points that best preserve the
+    visual shape of y over x.
+    """
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        low, high = edges[i], edges[i + 1]
+        # Average of the next bucket, or the last point for the final bucket
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        area = np.abs((x[a] - next_x) * (y[low:high] - y[a]) -
+                      (x[a] - x[low:high]) * (next_y - y[a]))
+        a = low + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_history(start, end, points, series):
+    """LTTB-selected points of one series over [start, end)"""
+    import numpy as np
+
+    record = MeasurementRecord
+    count = db.session.scalar(db.select(func.count()).select_from(record)
+                              .where(record.timestamp >= start, record.timestamp < end))
+    if count <= LTTB_RAW_LIMIT:
+        rows = db.session.execute(
+            db.select(record.timestamp, getattr(record, series))
+            .where(record.timestamp >= start, record.timestamp < end)
+            .order_by(record.timestamp)).all()
+        x = np.array([_to_epoch(row[0]) for row in rows])
+        y = np.array([row[1] for row in rows], dtype=np.float64)
+        source = 'raw'
+    else:
+        # Too many rows to scan: run LTTB over fine-grained bucket means
+        width, source, buckets = downsample(start, end, LTTB_RAW_LIMIT)
+        keys = sorted(buckets)
+        column = 3 if series == 'voltage' else 6
+        x = np.array(keys, dtype=np.float64) * width
+        y = np.array([buckets[key][column] for key in keys])
+
+    selected = lttb(x, y, points)
+    return source, x[selected].tolist(), y[selected].tolist()
+
+
+def _parse_time(value, default):
+    """Parse epoch seconds or an ISO 8601 string into a naive UTC datetime"""
+    if value is None:
+        return default
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+@history_api.route('/measurements')
+def measurement_history():
+    """Downsampled measurement history for a time range
+
+    Query parameters: start and end (epoch seconds or ISO 8601, default the
+    last hour), points (default 2000), method ('minmax' buckets or 'lttb')
+    and, for LTTB, series ('voltage' or 'frequency').
+    """
+    try:
+        end = _parse_time(request.args.get('end'),
+                          datetime.now(timezone.utc).replace(tzinfo=None))
+        start = _parse_time(request.args.get('start'), end - DEFAULT_RANGE)
+        points = min(int(request.args.get('points', DEFAULT_POINTS)), MAX_POINTS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start >= end or points < 1:
+        return jsonify({'error': 'start must be before end and points positive'}), 400
+
+    response = {'start': _to_epoch(start), 'end': _to_epoch(end)}
+    method = request.args.get('method', 'minmax')
+    if method == 'lttb':
+        series = request.args.get('series', 'voltage')
+        if series not in SERIES:
+            return jsonify({'error': f'unknown series {series!r}'}), 400
+        source, timestamps, values = lttb_history(start, end, points, series)
+        response.update(source=source, series=series,
+                        timestamp=timestamps, value=values)
+        return jsonify(response)
+    if method != 'minmax':
+        return jsonify({'error': f'unknown method {method!r}'}), 400
+
+    width, source, buckets = downsample(start, end, points)
+    keys = sorted(buckets)
+    columns = ('count', 'voltage_min', 'voltage_max', 'voltage_mean',
+               'frequency_min', 'frequency_max', 'frequency_mean')
+    response.update(bucket_seconds=width, source=source,
+                    timestamp=[key * width for key in keys])
+    for i, column in enumerate(columns):
+        response[column] = [buckets[key][i] for key in keys]
+    return jsonify(response)
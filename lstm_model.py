@@ -1,29 +1,208 @@
+import io
+import logging
+from typing import Optional, Tuple
+import numpy as np
 import torch
 import torch.nn as nn
 
+CHECKPOINT_TYPE = 'lstm'
+# Exported TorchScript artifacts, preferred over eager weights when current
+SCRIPTED_TYPE = 'lstm_scripted'
+QUANTIZED_TYPE = 'lstm_quantized'
+
 class LSTM(nn.Module):
     def __init__(self, input_size=1, hidden_size=32, num_layers=2):
         super(LSTM, self).__init__()
         self.hidden_size = hidden_size
         self.num_layers = num_layers
-        
+
         self.lstm = nn.LSTM(input_size, hidden_size, num_layers, batch_first=True)
         self.fc = nn.Linear(hidden_size, 1)
-        
+
     def forward(self, x):
-        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size)
-        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size)
-        
-        out, _ = self.lstm(x, (h0, c0))
+        # nn.LSTM starts from a zero hidden state when none is passed
+        out, _ = self.lstm(x)
         out = self.fc(out[:, -1, :])
         return out
 
+    # Annotated and exported so the method survives TorchScript compilation
+    @torch.jit.export
+    def step(self, x, state: Optional[Tuple[torch.Tensor, torch.Tensor]] = None):
+        """Advance the (h, c) state over a (batch, length, 1) input
+
+        Returns the next-value prediction and the new state. Feeding one
+        sample at a time lets a stream be consumed in O(1) per step.
+        """
+        out, state = self.lstm(x, state)
+        return self.fc(out[:, -1, :]), state
+
+def save_checkpoint(model, performance_metric, parameter_type=CHECKPOINT_TYPE):
+    """Store a model as ModelParameters (needs an app context)
+
+    Eager models are stored as a state dict, TorchScript modules as a
+    complete serialized artifact.
+    """
+    from app import db
+    from models import ModelParameters
+
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    record = ModelParameters(parameter_type=parameter_type,
+                             model_state=buffer.getvalue(),
+                             performance_metric=performance_metric)
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+def best_checkpoint(parameter_type=CHECKPOINT_TYPE):
+    """ModelParameters record with the lowest validation error, if any"""
+    from app import db
+    from models import ModelParameters
+
+    query = (db.select(ModelParameters)
+             .filter_by(parameter_type=parameter_type)
+             .filter(ModelParameters.performance_metric.isnot(None))
+             .order_by(ModelParameters.performance_metric.asc(),
+                       ModelParameters.timestamp.desc())
+             .limit(1))
+    return db.session.execute(query).scalar()
+
+def latest_exported_checkpoint():
+    """Most recently exported TorchScript artifact, if any"""
+    from app import db
+    from models import ModelParameters
+
+    query = (db.select(ModelParameters)
+             .filter(ModelParameters.parameter_type.in_([SCRIPTED_TYPE,
+                                                         QUANTIZED_TYPE]))
+             .order_by(ModelParameters.timestamp.desc())
+             .limit(1))
+    return db.session.execute(query).scalar()
+
 class LSTMPredictor:
-    def __init__(self):
+    def __init__(self, rewarm_interval=None, loc=0.0, scale=1.0):
         self.model = LSTM()
-        self.model.eval() 
+        self.model.eval()
+        self._inputs = {}
+
+        # Per-stream normalization: the model sees (x - loc) / scale
+        self.loc = np.asarray(loc, dtype=np.float32).reshape(-1, 1)
+        self.scale = np.asarray(scale, dtype=np.float32).reshape(-1, 1)
+
+        # Streaming inference state carried across ticks
+        self.rewarm_interval = rewarm_interval
+        self._stream_state = None
+        self._stream_steps = 0
+
+    def load_best_checkpoint(self, prefer_exported=True):
+        """Load the best stored weights, keeping random ones if none exist
+
+        A TorchScript export is preferred as long as it was produced after
+        the best eager checkpoint was trained, i.e. it is not stale.
+        """
+        record = best_checkpoint()
+        exported = latest_exported_checkpoint() if prefer_exported else None
+        if exported is not None and (record is None or
+                                     exported.timestamp >= record.timestamp):
+            self.model = torch.jit.load(io.BytesIO(exported.model_state))
+            self.model.eval()
+            self.reset_stream()
+            logging.info(f'Loaded {exported.parameter_type} checkpoint {exported.id}')
+            return exported
+
+        if record is None:
+            logging.warning('No trained LSTM checkpoint found, using random weights')
+            return None
+
+        state = torch.load(io.BytesIO(record.model_state), weights_only=True)
+        self.model.load_state_dict(state)
+        self.reset_stream()
+        logging.info(f'Loaded LSTM checkpoint {record.id} '
+                     f'(validation RMSE {record.performance_metric:.4f})')
+        return record
+
+    def _normalize(self, sequences):
+        """Scale a (batch, length) array into the units the model was trained on"""
+        return (sequences - self.loc) / self.scale
+
+    def _denormalize(self, prediction):
+        return prediction.view(-1).numpy() * self.scale[:, 0] + self.loc[:, 0]
+
     def predict(self, sequence):
         """Make prediction for the next value"""
         with torch.no_grad():
             prediction = self.model(sequence)
             return prediction.item()
+
+    def _input_buffer(self, batch, length):
+        """Reusable (batch, length, 1) input tensor, grown only when needed"""
+        buffer = self._inputs.get(length)
+        if buffer is None or buffer.size(0) < batch:
+            buffer = torch.empty(batch, length, 1)
+            self._inputs[length] = buffer
+        return buffer[:batch]
+
+    def predict_batch(self, sequences):
+        """Predict the next value of many sequences in one forward pass
+
+        `sequences` is a (batch, length) array, one row per monitored
+        stream. Returns a NumPy array with one prediction per row.
+        """
+        sequences = self._normalize(np.asarray(sequences, dtype=np.float32))
+        batch, length = sequences.shape
+
+        x = self._input_buffer(batch, length)
+        x[:, :, 0].copy_(torch.from_numpy(sequences))
+        with torch.inference_mode():
+            prediction = self.model(x)
+        return self._denormalize(prediction)
+
+    @property
+    def stream_needs_warmup(self):
+        """Whether the streaming state must be (re)built from full windows"""
+        if self._stream_state is None:
+            return True
+        return bool(self.rewarm_interval and
+                    self._stream_steps >= self.rewarm_interval)
+
+    def reset_stream(self):
+        """Drop the carried hidden state"""
+        self._stream_state = None
+        self._stream_steps = 0
+
+    def warm_stream(self, sequences):
+        """Start streaming from (batch, length) windows
+
+        Rebuilds the hidden state from a zero state, exactly as
+        predict_batch does, and returns the same predictions.
+        """
+        sequences = self._normalize(np.asarray(sequences, dtype=np.float32))
+        batch, length = sequences.shape
+
+        x = self._input_buffer(batch, length)
+        x[:, :, 0].copy_(torch.from_numpy(sequences))
+        with torch.inference_mode():
+            prediction, self._stream_state = self.model.step(x)
+        self._stream_steps = 0
+        return self._denormalize(prediction)
+
+    def predict_step(self, values):
+        """Feed the newest sample of each stream and predict the next value
+
+        Costs a single LSTM step regardless of the window length. Unlike
+        predict_batch, the prediction depends on the full history since
+        the last warm_stream call.
+        """
+        if self._stream_state is None:
+            raise RuntimeError('warm_stream must be called before predict_step')
+
+        values = self._normalize(np.asarray(values, dtype=np.float32).reshape(-1, 1))
+        x = self._input_buffer(len(values), 1)
+        x[:, :, 0].copy_(torch.from_numpy(values))
+        with torch.inference_mode():
+            prediction, self._stream_state = self.model.step(x, self._stream_state)
+        self._stream_steps += 1
+        return self._denormalize(prediction)
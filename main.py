@@ -1,231 +1,357 @@
-from flask import Flask, render_template
+import time
+process_start = time.perf_counter()
+
+import os
+from flask import render_template, request
 from flask_socketio import SocketIO
-import torch
-import numpy as np
 import logging
-import time
-from data_simulator import DataSimulator
-from lstm_model import LSTMPredictor
-from control_logic import ControlLogic
+import argparse
+import threading
+from control_logic import (ControlLogic, STABILITY_GAIN_RATE, STABILITY_LOSS_RATE,
+                           PERFECT_MODE_THRESHOLD, CORRECTION_RATE, CORRECTION_GAIN,
+                           DESTABILIZE_HOLDOFF)
+from sim_clock import WallClock, VirtualClock
+from ring_buffer import RingBuffer
+from app import create_app
+from measurement_writer import MeasurementWriter
+from history import history_api
+from message_bus import CONTROL_CHANNEL, MessageBroker, MessageBus, MessageBusManager
+from broadcaster import Broadcaster
+from control_state import ControlState, CommandQueue
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'microgrid-secret'
-socketio = SocketIO(app)
+app = create_app()
+app.register_blueprint(history_api)
+
+# With MESSAGE_BUS set (host:port or a Unix socket path) the web tier can run
+# in several processes: the control loop then only runs in `main.py --worker`,
+# and emits, room changes and commands travel over the local message bus
+MESSAGE_BUS = os.environ.get('MESSAGE_BUS')
+if MESSAGE_BUS:
+    bus_authkey = app.config['SECRET_KEY'].encode()
+    socketio = SocketIO(app, client_manager=MessageBusManager(MESSAGE_BUS, bus_authkey))
+    message_bus = MessageBus(MESSAGE_BUS, bus_authkey)
+else:
+    socketio = SocketIO(app)
+    message_bus = None
 
 # Initialize components
-data_simulator = DataSimulator()
-lstm_model = LSTMPredictor()
-control_logic = ControlLogic()
+clock = WallClock()
+# Thresholds come from the latest SystemConfig, falling back to defaults
+with app.app_context():
+    control_logic = ControlLogic.from_system_config()
+# The simulator and predictor pull in numpy, torch and the replayed dataset,
+# so they are only built once the control loop or a warm-up needs them
+data_simulator = None
+lstm_model = None
+components_lock = threading.Lock()
+background_started = False
+# Updates are persisted in bulk off the control loop thread
+measurement_writer = MeasurementWriter(app)
+# Updates reach clients in throttled, packed batches per subscription room
+broadcaster = Broadcaster(socketio)
+# Control state belongs to the control loop; handlers only queue commands
+control_state = ControlState()
+commands = CommandQueue()
 
 # Global variables
 SEQUENCE_LENGTH = 10
-voltage_sequence = []
-frequency_sequence = []
-voltage_offset = 0
-frequency_offset = 0
-auto_stabilize = True
-NOMINAL_VOLTAGE = 230.0
-NOMINAL_FREQUENCY = 50.0
-stabilize_enabled = True  # Flag to control continuous stabilization
-perfect_stabilization = False  # Flag to toggle between standard vs perfect stabilization
-stabilization_quality = 0.0  # Track stabilization improvement (0 to 1)
-last_destabilize_time = 0  # Track when system was last destabilized
-PERFECT_MODE_THRESHOLD = 0.9  # Threshold for perfect mode transition
-STABILITY_GAIN_RATE = 0.02  # How fast system learns stability
-STABILITY_LOSS_RATE = 0.2  # How much stability is lost on destabilization
-PERFECT_MODE_THRESHOLD = 0.8  # Lower threshold for perfect mode transition
+UPDATE_INTERVAL = 1.0  # Seconds between control loop ticks
+sequence_window = RingBuffer(SEQUENCE_LENGTH, channels=2)  # [voltage, frequency]
+NOMINAL_VOLTAGE = float(control_logic.nominal_voltage)
+NOMINAL_FREQUENCY = float(control_logic.nominal_frequency)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-def background_task():
-    """Background task to generate and process data"""
-    global voltage_offset, frequency_offset, stabilization_quality, last_destabilize_time
+def init_components():
+    """Build the simulator and predictor on first use"""
+    global data_simulator, lstm_model
+
+    with components_lock:
+        if lstm_model is not None:
+            return
+
+        started = time.perf_counter()
+        from data_simulator import DataSimulator
+        from lstm_model import LSTMPredictor
+
+        data_simulator = DataSimulator(clock=clock)
+        # Predictions run on [voltage, frequency] rows, normalized around nominal
+        predictor = LSTMPredictor(
+            loc=[control_logic.nominal_voltage, control_logic.nominal_frequency],
+            scale=[control_logic.voltage_tolerance, control_logic.frequency_tolerance])
+        with app.app_context():
+            predictor.load_best_checkpoint()
+        lstm_model = predictor
+
+        logging.info(f'Components ready in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+def warm_up():
+    """Load components and run a throwaway prediction so the first tick is fast
+
+    Can be called from a gunicorn post_fork hook to warm workers eagerly.
+    """
+    init_components()
+    lstm_model.predict_batch([[NOMINAL_VOLTAGE] * SEQUENCE_LENGTH,
+                              [NOMINAL_FREQUENCY] * SEQUENCE_LENGTH])
+
+def start_background_task():
+    """Start the control loop once per process"""
+    global background_started
+
+    with components_lock:
+        if background_started:
+            return
+        background_started = True
+    measurement_writer.start()
+    socketio.start_background_task(background_task)
 
-    while True:
-        # Only improve stabilization quality if not in destabilized state
-        if (auto_stabilize and stabilize_enabled and 
-            time.time() - last_destabilize_time > 10):
-            stabilization_quality = min(1.0, stabilization_quality + STABILITY_GAIN_RATE)
-        # Generate new data point with manual adjustments
-        base_voltage, base_frequency = data_simulator.generate_data_point()
-        current_scenario = data_simulator.current_scenario
-        logging.debug(f"Current scenario: {current_scenario}")
-
-        # Adaptive stabilization based on system learning
-        if auto_stabilize and stabilize_enabled:
-            # Calculate how much perfect vs standard mode to apply
-            perfect_factor = stabilization_quality if not perfect_stabilization else 1.0
-
-            # Mix between perfect and standard modes
-            if perfect_factor > PERFECT_MODE_THRESHOLD:
-                # Closer to perfect mode
-                voltage = NOMINAL_VOLTAGE * perfect_factor + base_voltage * (1 - perfect_factor)
-                frequency = NOMINAL_FREQUENCY * perfect_factor + base_frequency * (1 - perfect_factor)
-                # Gradually reduce offsets
-                voltage_offset *= (1 - perfect_factor)
-                frequency_offset *= (1 - perfect_factor)
-            else:
-                # Normal mode with fluctuations
-                voltage = base_voltage + voltage_offset
-                frequency = base_frequency + frequency_offset
-                # Calculate how far we are from nominal values
-                voltage_deviation = NOMINAL_VOLTAGE - voltage
-                frequency_deviation = NOMINAL_FREQUENCY - frequency
-
-            # Only apply automatic stabilization if explicitly enabled
-            if auto_stabilize and stabilize_enabled and not perfect_stabilization:
-                # Apply faster corrections (40% per cycle)
-                voltage_correction = voltage_deviation * 0.4
-                frequency_correction = frequency_deviation * 0.4
-
-                # Update offsets to stabilize the system with stronger adjustments
-                voltage_offset += voltage_correction * 2.0
-                frequency_offset += frequency_correction * 2.0
+def send_command(command, data):
+    """Hand a command to the control loop, wherever it runs"""
+    if message_bus is not None:
+        message_bus.publish(CONTROL_CHANNEL, (command, data))
+    else:
+        commands.put(command, data)
+
+def apply_commands():
+    """Apply queued commands and due timers before a tick"""
+    now = clock.time()
+    for command, data in commands.drain():
+        if command == 'subscribe':
+            broadcaster.subscribe(data['sid'], data['nodes'], data['metrics'], data['interval'])
+        elif command == 'unsubscribe':
+            broadcaster.unsubscribe(data['sid'])
+        else:
+            control_state.apply(command, data, now)
+    control_state.advance(now)
+
+def process_tick():
+    """Advance the pipeline by one step and return the update for clients
+
+    Returns None while the LSTM input window is still filling up.
+    """
+    state = control_state
+    apply_commands()
+
+    # Only improve stabilization quality if not in destabilized state
+    if (state.auto_stabilize and state.stabilize_enabled and
+        clock.time() - state.last_destabilize_time > DESTABILIZE_HOLDOFF):
+        state.stabilization_quality = min(1.0, state.stabilization_quality + STABILITY_GAIN_RATE)
+    # Generate new data point with manual adjustments
+    base_voltage, base_frequency = data_simulator.generate_data_point()
+    current_scenario = data_simulator.current_scenario
+    logging.debug(f"Current scenario: {current_scenario}")
+
+    voltage = base_voltage + state.voltage_offset
+    frequency = base_frequency + state.frequency_offset
+
+    # Adaptive stabilization based on system learning
+    if state.auto_stabilize and state.stabilize_enabled:
+        # Calculate how much perfect vs standard mode to apply
+        perfect_factor = state.stabilization_quality if not state.perfect_stabilization else 1.0
+
+        # Mix between perfect and standard modes
+        if perfect_factor > PERFECT_MODE_THRESHOLD:
+            # Closer to perfect mode
+            voltage = NOMINAL_VOLTAGE * perfect_factor + base_voltage * (1 - perfect_factor)
+            frequency = NOMINAL_FREQUENCY * perfect_factor + base_frequency * (1 - perfect_factor)
+            # Gradually reduce offsets
+            state.voltage_offset *= (1 - perfect_factor)
+            state.frequency_offset *= (1 - perfect_factor)
+
+    # Calculate how far we are from nominal values
+    voltage_deviation = NOMINAL_VOLTAGE - voltage
+    frequency_deviation = NOMINAL_FREQUENCY - frequency
+
+    # Only apply automatic stabilization if explicitly enabled
+    if state.auto_stabilize and state.stabilize_enabled and not state.perfect_stabilization:
+        # Apply faster corrections (40% per cycle)
+        voltage_correction = voltage_deviation * CORRECTION_RATE
+        frequency_correction = frequency_deviation * CORRECTION_RATE
+
+        # Update offsets to stabilize the system with stronger adjustments
+        state.voltage_offset += voltage_correction * CORRECTION_GAIN
+        state.frequency_offset += frequency_correction * CORRECTION_GAIN
+
+        # Log significant corrections
+        if abs(voltage_correction) > 0.5 or abs(frequency_correction) > 0.05:
+            logging.debug(f"Auto-stabilizing: V:{voltage_correction:.2f}, F:{frequency_correction:.2f}")
+
+    # Update sequences
+    sequence_window.append((voltage, frequency))
+    if not sequence_window.full:
+        return None
+
+    # Predict both streams in a single pass, stepping the carried LSTM state
+    # by one sample per tick once it has been warmed up on a full window
+    if lstm_model.stream_needs_warmup:
+        predictions = lstm_model.warm_stream(sequence_window.view())
+    else:
+        predictions = lstm_model.predict_step([voltage, frequency])
+    next_voltage, next_frequency = predictions
+
+    # Get control actions based on auto-stabilize setting
+    if state.auto_stabilize:
+        v_action = control_logic.get_voltage_action(next_voltage)
+        f_action = control_logic.get_frequency_action(next_frequency)
+
+        # Add more specific actions when auto-stabilizing
+        if abs(voltage_deviation) > 1.0:
+            if voltage_deviation > 0:
+                v_action = f"Increase Volt ({voltage_deviation:.1f}V)"
             else:
-                # When auto-stabilize is off, don't modify the offsets
-                voltage_correction = 0
-                frequency_correction = 0
-
-            # Log significant corrections
-            if abs(voltage_correction) > 0.5 or abs(frequency_correction) > 0.05:
-                logging.debug(f"Auto-stabilizing: V:{voltage_correction:.2f}, F:{frequency_correction:.2f}")
-
-
-        # Update sequences
-        voltage_sequence.append(voltage)
-        frequency_sequence.append(frequency)
-        if len(voltage_sequence) > SEQUENCE_LENGTH:
-            voltage_sequence.pop(0)
-            frequency_sequence.pop(0)
-
-        if len(voltage_sequence) == SEQUENCE_LENGTH:
-            # Prepare input for LSTM
-            v_seq = torch.FloatTensor(voltage_sequence).view(1, -1, 1)
-            f_seq = torch.FloatTensor(frequency_sequence).view(1, -1, 1)
-
-            # Get predictions
-            next_voltage = lstm_model.predict(v_seq)
-            next_frequency = lstm_model.predict(f_seq)
-
-            # Get control actions based on auto-stabilize setting
-            if auto_stabilize:
-                v_action = control_logic.get_voltage_action(next_voltage)
-                f_action = control_logic.get_frequency_action(next_frequency)
-
-                # Add more specific actions when auto-stabilizing
-                if abs(voltage_deviation) > 1.0:
-                    if voltage_deviation > 0:
-                        v_action = f"Increase Volt ({voltage_deviation:.1f}V)"
-                    else:
-                        v_action = f"Decrease Volt ({-voltage_deviation:.1f}V)"
-
-                if abs(frequency_deviation) > 0.1:
-                    if frequency_deviation > 0:
-                        f_action = f"Increase Freq ({frequency_deviation:.2f}Hz)"
-                    else:
-                        f_action = f"Decrease Freq ({-frequency_deviation:.2f}Hz)"
+                v_action = f"Decrease Volt ({-voltage_deviation:.1f}V)"
+
+        if abs(frequency_deviation) > 0.1:
+            if frequency_deviation > 0:
+                f_action = f"Increase Freq ({frequency_deviation:.2f}Hz)"
             else:
-                # More helpful manual control recommendations
-                v_action = f"Manual Control (Needs {voltage_deviation:.1f}V)"
-                f_action = f"Manual Control (Needs {frequency_deviation:.2f}Hz)"
-
-            # Emit data to clients
-            socketio.emit('update_data', {
-                'voltage': voltage,
-                'frequency': frequency,
-                'predicted_voltage': float(next_voltage),
-                'predicted_frequency': float(next_frequency),
-                'voltage_action': v_action,
-                'frequency_action': f_action,
-                'timestamp': time.time()
-            })
-
-        time.sleep(1)
+                f_action = f"Decrease Freq ({-frequency_deviation:.2f}Hz)"
+    else:
+        # More helpful manual control recommendations
+        v_action = f"Manual Control (Needs {voltage_deviation:.1f}V)"
+        f_action = f"Manual Control (Needs {frequency_deviation:.2f}Hz)"
+
+    return {
+        'voltage': float(voltage),
+        'frequency': float(frequency),
+        'predicted_voltage': float(next_voltage),
+        'predicted_frequency': float(next_frequency),
+        'voltage_action': v_action,
+        'frequency_action': f_action,
+        'timestamp': clock.time()
+    }
+
+def background_task():
+    """Background task to generate and process data"""
+    warm_up()
+    while True:
+        update = process_tick()
+        if update is not None:
+            broadcaster.publish_update(update)
+            measurement_writer.submit(update)
+        # Send batches to the clients whose update interval has elapsed
+        broadcaster.flush()
+
+        clock.sleep(UPDATE_INTERVAL)
+
+def run_headless(duration, start=None, on_update=None):
+    """Run the pipeline without the dashboard on a virtual clock
+
+    Simulates `duration` seconds of grid operation as fast as possible and
+    passes every update to `on_update` if given. Returns the number of
+    ticks processed.
+    """
+    global clock, data_simulator
+
+    clock = VirtualClock(start)
+    init_components()
+    from data_simulator import DataSimulator
+    data_simulator = DataSimulator(clock=clock)
+
+    ticks = int(duration / UPDATE_INTERVAL)
+    wall_start = time.perf_counter()
+    for _ in range(ticks):
+        update = process_tick()
+        if update is not None and on_update is not None:
+            on_update(update)
+        clock.sleep(UPDATE_INTERVAL)
+
+    elapsed = time.perf_counter() - wall_start
+    logging.info(f'Simulated {duration:.0f}s in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s)')
+    return ticks
 
 @socketio.on('connect')
 def handle_connect():
     logging.debug('Client connected')
+    # Every client gets the default stream until it subscribes to another
+    nodes, metrics, interval = broadcaster.normalize()
+    send_command('subscribe', {'sid': request.sid, 'nodes': nodes,
+                               'metrics': metrics, 'interval': interval})
+    # Under gunicorn nothing runs __main__, so the first client starts the
+    # loop, unless a separate simulation worker owns it
+    if message_bus is None:
+        start_background_task()
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    send_command('unsubscribe', {'sid': request.sid})
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Choose nodes, metrics and the update interval (seconds) for this client"""
+    try:
+        nodes, metrics, interval = broadcaster.normalize(
+            data.get('nodes'), data.get('metrics'), data.get('interval'))
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}
+    send_command('subscribe', {'sid': request.sid, 'nodes': nodes,
+                               'metrics': metrics, 'interval': interval})
+    logging.debug(f'Client {request.sid} subscribing to {nodes} {metrics} every {interval}s')
+    return {'nodes': nodes, 'metrics': metrics, 'interval': interval}
 
 @socketio.on('manual_adjustment')
 def handle_manual_adjustment(data):
-    global voltage_offset, frequency_offset, auto_stabilize, stabilize_enabled, stabilization_quality, last_destabilize_time
-
-    if data['type'] == 'voltage':
-        voltage_offset = data['value']
-    else:
-        frequency_offset = data['value']
-
-    auto_stabilize = data['auto_stabilize']
-
-    # Pause stabilization for 3 seconds when manual adjustment is made
-    # to allow the user to see the effect of their change
-    stabilize_enabled = False
-    logging.debug(f'Manual adjustment: {data}, temporarily pausing stabilization')
-
-    # Re-enable stabilization after 3 seconds if auto-stabilize is on
-    if auto_stabilize:
-        def resume_stabilization():
-            global stabilize_enabled
-            time.sleep(3)  # Wait for 3 seconds
-            stabilize_enabled = True
-            logging.debug('Stabilization resumed')
-
-        socketio.start_background_task(target=resume_stabilization)
+    send_command('manual_adjustment', {'type': data['type'], 'value': data['value'],
+                                       'auto_stabilize': data['auto_stabilize']})
 
 @socketio.on('set_auto_stabilize')
 def handle_auto_stabilize(data):
-    global auto_stabilize, stabilize_enabled
-    auto_stabilize = data['enabled']
-    stabilize_enabled = True  # Always enable stabilization when toggling
-
-    # Clear any manual offsets when auto-stabilize is enabled
-    if auto_stabilize:
-        def smooth_reset():
-            global voltage_offset, frequency_offset
-            steps = 10
-            v_step = voltage_offset / steps
-            f_step = frequency_offset / steps
-
-            for _ in range(steps):
-                if not auto_stabilize:  # Stop if auto-stabilize was turned off
-                    break
-                voltage_offset -= v_step
-                frequency_offset -= f_step
-                time.sleep(0.3)
-
-            # Final reset to ensure precision
-            if auto_stabilize:
-                voltage_offset = 0
-                frequency_offset = 0
-
-        socketio.start_background_task(smooth_reset)
-
-    logging.debug(f'Auto-stabilize set to: {auto_stabilize}')
+    send_command('set_auto_stabilize', {'enabled': data['enabled']})
 
 @socketio.on('set_stabilization_mode')
 def handle_stabilization_mode(data):
-    global perfect_stabilization, stabilization_quality, last_destabilize_time, auto_stabilize, stabilize_enabled
-    perfect_stabilization = data['perfect_mode']
+    send_command('set_stabilization_mode', {
+        'perfect_mode': data['perfect_mode'],
+        'destabilize': data.get('destabilize', False),
+        'force_manual': data.get('force_manual', False),
+    })
 
-    if data.get('destabilize', False):
-        # Reset learning progress on destabilization
-        stabilization_quality *= (1 - STABILITY_LOSS_RATE)
-        last_destabilize_time = time.time()
-        logging.debug(f'System destabilized, stability reduced to {stabilization_quality}')
+def run_worker():
+    """Run the control loop as the single simulation worker behind a message bus"""
+    if not MessageBroker(MESSAGE_BUS, bus_authkey).start():
+        logging.info(f'Using the message bus already running at {MESSAGE_BUS}')
 
-        # Force disable auto-stabilization if manual mode is requested
-        if data.get('force_manual', False):
-            auto_stabilize = False
-            stabilize_enabled = False
-            logging.debug('Forced manual control mode')
+    def receive_commands():
+        for _, (command, data) in message_bus.listen(CONTROL_CHANNEL):
+            commands.put(command, data)
 
-    logging.debug(f'Perfect stabilization mode set to: {perfect_stabilization}, quality: {stabilization_quality}')
+    threading.Thread(target=receive_commands, name='control-commands', daemon=True).start()
+    measurement_writer.start()
+    background_task()
+
+logging.info(f'App ready in {(time.perf_counter() - process_start) * 1000:.0f} ms')
 
 if __name__ == '__main__':
-    socketio.start_background_task(background_task)
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Microgrid stabilization simulator')
+    parser.add_argument('--headless', action='store_true',
+                        help='run the control loop on a virtual clock without the dashboard')
+    parser.add_argument('--duration', type=float, default=86400,
+                        help='simulated seconds to run in headless mode')
+    parser.add_argument('--persist', action='store_true',
+                        help='store headless measurements in the database')
+    parser.add_argument('--worker', action='store_true',
+                        help='run only the control loop, serving web processes over MESSAGE_BUS')
+    args = parser.parse_args()
+
+    if args.headless:
+        logging.getLogger().setLevel(logging.INFO)
+        if args.persist:
+            measurement_writer.start()
+            run_headless(args.duration, on_update=measurement_writer.submit)
+            measurement_writer.stop()
+            logging.info(f'Stored {measurement_writer.written} measurements, '
+                         f'dropped {measurement_writer.dropped}')
+        else:
+            run_headless(args.duration)
+    elif args.worker:
+        if message_bus is None:
+            parser.error('--worker needs MESSAGE_BUS to be set')
+        run_worker()
+    else:
+        start_background_task()
+        socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from models import MeasurementRecord
+
+
+class MeasurementWriter:
+    """Write-behind buffer that persists control loop updates in bulk
+
+    The control loop only enqueues; a separate thread flushes batches with a
+    single multi-row insert whenever batch_size rows are pending or
+    flush_interval seconds have passed. When the database falls behind and
+    the queue fills up, new updates are dropped and counted instead of
+    blocking the loop.
+    """
+
+    def __init__(self, app, batch_size=500, flush_interval=5.0, max_pending=10_000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def pending(self):
+        return self.queue.qsize()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='measurement-writer',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flush everything still queued and stop the worker"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, update):
+        """Queue a control loop update without ever blocking"""
+        try:
+            self.queue.put_nowait(update)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning(f'Measurement queue full, {self.dropped} updates dropped so far')
+
+    def _run(self):
+        while not self._stop.is_set() or not self.queue.empty():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self):
+        """Wait for a full batch or the flush interval, whichever comes first"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self.queue.empty()):
+                break
+            try:
+                batch.append(self.queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _flush(self, batch):
+        rows = [self._to_row(update) for update in batch]
+        with self.app.app_context():
+            try:
+                db.session.execute(db.insert(MeasurementRecord), rows)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                self.dropped += len(rows)
+                logging.exception(f'Failed to persist {len(rows)} measurements')
+                return
+        self.written += len(rows)
+        self.flushes += 1
+
+    @staticmethod
+    def _to_row(update):
+        # Stored as naive UTC, like the column's utcnow default
+        timestamp = datetime.fromtimestamp(update['timestamp'], timezone.utc)
+        return {
+            'timestamp': timestamp.replace(tzinfo=None),
+            'voltage': update['voltage'],
+            'frequency': update['frequency'],
+            'predicted_voltage': update['predicted_voltage'],
+            'predicted_frequency': update['predicted_frequency'],
+            'voltage_action': update['voltage_action'],
+            'frequency_action': update['frequency_action'],
+        }
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from socketio import PubSubManager
+
+# Channel carrying commands from the web processes to the simulation worker
+CONTROL_CHANNEL = 'control'
+RECONNECT_DELAY = 1.0
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host or 'localhost', int(port)
+    return address
+
+
+class MessageBroker:
+    """Minimal local pub/sub broker standing in for Redis
+
+    Connections either publish (channel, message) pairs or subscribe to a
+    set of channels; every published message is relayed to all subscribers
+    of its channel, including the sender's own subscription.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.subscribers = {}  # connection -> (channels, send lock)
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def start(self):
+        """Serve in background threads; returns False if a broker already runs"""
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            try:
+                Client(self.address, authkey=self.authkey).close()
+                return False
+            except OSError:
+                os.unlink(self.address)  # Left behind by a dead broker
+        try:
+            self.listener = Listener(self.address, authkey=self.authkey)
+        except OSError:
+            return False
+        threading.Thread(target=self._accept, name='message-broker', daemon=True).start()
+        logging.info(f'Message bus listening on {self.address}')
+        return True
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                # Failed handshake, e.g. a client with the wrong authkey
+                logging.warning('Rejected message bus connection', exc_info=True)
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'subscribe':
+                    with self.lock:
+                        self.subscribers[connection] = (set(message[1]), threading.Lock())
+                else:
+                    self._relay(message[1], message[2])
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.lock:
+                self.subscribers.pop(connection, None)
+            connection.close()
+
+    def _relay(self, channel, payload):
+        with self.lock:
+            targets = [(connection, send_lock)
+                       for connection, (channels, send_lock) in self.subscribers.items()
+                       if channel in channels]
+        for connection, send_lock in targets:
+            try:
+                with send_lock:
+                    connection.send((channel, payload))
+            except (OSError, ValueError):
+                # The subscriber's own thread notices and cleans up
+                pass
+
+
+class MessageBus:
+    """Client side of the MessageBroker"""
+
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        """Send a message, dropping it if the broker cannot be reached"""
+        with self._lock:
+            try:
+                if self._connection is None:
+                    self._connection = Client(self.address, authkey=self.authkey)
+                self._connection.send(('publish', channel, message))
+                return True
+            except OSError:
+                logging.warning(f'Message bus unavailable, dropped message on {channel!r}')
+                self._connection = None
+                return False
+
+    def listen(self, *channels):
+        """Yield (channel, message) forever, reconnecting when the broker restarts"""
+        while True:
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+            except OSError:
+                time.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                connection.send(('subscribe', channels))
+                while True:
+                    yield connection.recv()
+            except (EOFError, OSError):
+                logging.warning('Lost message bus connection, reconnecting')
+            finally:
+                connection.close()
+
+
+class MessageBusManager(PubSubManager):
+    """Socket.IO client manager sharing rooms and emits over the MessageBus
+
+    Plays the role of python-socketio's RedisManager for a single host, so
+    several web processes and the simulation worker can reach each other's
+    clients without an external message queue.
+    """
+    name = 'messagebus'
+
+    def __init__(self, address, authkey, channel='flask-socketio', write_only=False,
+                 logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = MessageBus(address, authkey)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        for _, message in self.bus.listen(self.channel):
+            yield message
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Run the local message bus broker')
+    parser.add_argument('address', nargs='?', default=os.environ.get('MESSAGE_BUS'),
+                        help='host:port or Unix socket path (default $MESSAGE_BUS)')
+    args = parser.parse_args()
+    if not args.address:
+        parser.error('no address given and MESSAGE_BUS is not set')
+
+    authkey = os.environ.get('SESSION_SECRET', 'microgrid-secret').encode()
+    if not MessageBroker(args.address, authkey).start():
+        parser.exit(1, f'A message bus is already running at {args.address}\n')
+    threading.Event().wait()
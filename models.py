@@ -5,13 +5,13 @@ from app import db
 class MeasurementRecord(db.Model):
     """Model for storing voltage and frequency measurements"""
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     voltage = db.Column(db.Float, nullable=False)
     frequency = db.Column(db.Float, nullable=False)
     predicted_voltage = db.Column(db.Float, nullable=False)
     predicted_frequency = db.Column(db.Float, nullable=False)
-    voltage_action = db.Column(db.String(20), nullable=False)
-    frequency_action = db.Column(db.String(20), nullable=False)
+    voltage_action = db.Column(db.String(64), nullable=False)
+    frequency_action = db.Column(db.String(64), nullable=False)
 
     def __repr__(self):
         return f'<MeasurementRecord {self.timestamp}: V={self.voltage:.2f}V, F={self.frequency:.2f}Hz>'
@@ -30,6 +30,25 @@ class MeasurementRecord(db.Model):
         }
 
 
+class MeasurementRollup(db.Model):
+    """Cached min/max/mean aggregates of MeasurementRecord over fixed buckets"""
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.Integer, nullable=False)  # Bucket width in seconds
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    voltage_min = db.Column(db.Float, nullable=False)
+    voltage_max = db.Column(db.Float, nullable=False)
+    voltage_mean = db.Column(db.Float, nullable=False)
+    frequency_min = db.Column(db.Float, nullable=False)
+    frequency_max = db.Column(db.Float, nullable=False)
+    frequency_mean = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('resolution', 'bucket_start'),)
+
+    def __repr__(self):
+        return f'<MeasurementRollup {self.resolution}s at {self.bucket_start}: n={self.count}>'
+
+
 class ModelParameters(db.Model):
     """Model for storing LSTM model parameters"""
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,182 @@
+import numpy as np
+from grid_dataset import GridDataset
+from control_logic import (ControlLogic, STABILITY_GAIN_RATE, STABILITY_LOSS_RATE,
+                           PERFECT_MODE_THRESHOLD, CORRECTION_RATE, CORRECTION_GAIN,
+                           DESTABILIZE_HOLDOFF)
+from sim_clock import WallClock
+from ring_buffer import RingBuffer
+
+
+class MultiNodeSimulator:
+    """Vectorized simulation of many microgrid buses at once
+
+    Every per-bus quantity of the single-bus loop in main.py (scenario,
+    offsets, stabilization learning, input windows) is held in a NumPy
+    array with one entry per node, and step() advances all nodes together.
+    Scenario definitions come from GridDataset and nominal values and
+    tolerances from ControlLogic.
+    """
+
+    def __init__(self, n_nodes, dataset=None, control_logic=None,
+                 sequence_length=10, predictor=None, clock=None, seed=None):
+        self.n_nodes = n_nodes
+        self.clock = clock or WallClock()
+        self.dataset = dataset or GridDataset(clock=self.clock)
+        self.control_logic = control_logic or ControlLogic()
+        self.sequence_length = sequence_length
+        self.predictor = predictor
+        self.rng = np.random.default_rng(seed)
+
+        scenarios = self.dataset.scenarios
+        self.scenario_names = list(scenarios)
+        self.recovery_time = np.array(
+            [scenarios[s]['recovery_time'] for s in scenarios], dtype=np.float64)
+
+        # Scenario state
+        now = self.clock.time()
+        self.scenario = np.zeros(n_nodes, dtype=np.int8)
+        self.event_start = np.full(n_nodes, now)
+        self.event_duration = np.zeros(n_nodes)
+
+        # Each node replays the recording from its own offset
+        self.row_offset = self.rng.integers(len(self.dataset.replay), size=n_nodes)
+        self.tick = 0
+
+        # Control state
+        self.voltage_offset = np.zeros(n_nodes)
+        self.frequency_offset = np.zeros(n_nodes)
+        self.auto_stabilize = np.ones(n_nodes, dtype=bool)
+        self.stabilize_enabled = np.ones(n_nodes, dtype=bool)
+        self.perfect_stabilization = np.zeros(n_nodes, dtype=bool)
+        self.stabilization_quality = np.zeros(n_nodes)
+        self.last_destabilize_time = np.zeros(n_nodes)
+
+        # Latest outputs
+        self.voltage = np.full(n_nodes, float(self.control_logic.nominal_voltage))
+        self.frequency = np.full(n_nodes, float(self.control_logic.nominal_frequency))
+        self.stability_score = np.ones(n_nodes)
+        self.predicted_voltage = np.full(n_nodes, np.nan)
+        self.predicted_frequency = np.full(n_nodes, np.nan)
+
+        # Input windows, one channel per stream with voltages first
+        self.window = RingBuffer(sequence_length, channels=2 * n_nodes)
+
+    def _update_scenarios(self, now):
+        """Redraw the scenario of every node whose event has run out"""
+        expired = np.flatnonzero(now - self.event_start >= self.event_duration)
+        if len(expired) == 0:
+            return
+        probabilities = self.dataset._scenario_probabilities(self.clock.now().hour)
+        codes = self.rng.choice(len(self.scenario_names), size=len(expired),
+                                p=probabilities)
+        self.scenario[expired] = codes
+        self.event_start[expired] = now
+        self.event_duration[expired] = self.recovery_time[codes]
+
+    def _stabilize(self, now, base_voltage, base_frequency):
+        """Vectorized version of the adaptive stabilization in main.process_tick"""
+        nominal_voltage = self.control_logic.nominal_voltage
+        nominal_frequency = self.control_logic.nominal_frequency
+        active = self.auto_stabilize & self.stabilize_enabled
+
+        # Only improve stabilization quality if not in destabilized state
+        learning = active & (now - self.last_destabilize_time > DESTABILIZE_HOLDOFF)
+        self.stabilization_quality[learning] = np.minimum(
+            1.0, self.stabilization_quality[learning] + STABILITY_GAIN_RATE)
+
+        voltage = base_voltage + self.voltage_offset
+        frequency = base_frequency + self.frequency_offset
+
+        # Mix towards nominal for nodes that are close to perfect mode
+        perfect_factor = np.where(self.perfect_stabilization, 1.0,
+                                  self.stabilization_quality)
+        mixing = active & (perfect_factor > PERFECT_MODE_THRESHOLD)
+        if mixing.any():
+            factor = perfect_factor[mixing]
+            voltage[mixing] = (nominal_voltage * factor +
+                               base_voltage[mixing] * (1 - factor))
+            frequency[mixing] = (nominal_frequency * factor +
+                                 base_frequency[mixing] * (1 - factor))
+            self.voltage_offset[mixing] *= 1 - factor
+            self.frequency_offset[mixing] *= 1 - factor
+
+        # Proportional correction of the offsets
+        correcting = active & ~self.perfect_stabilization
+        gain = np.where(correcting, CORRECTION_RATE * CORRECTION_GAIN, 0.0)
+        self.voltage_offset += (nominal_voltage - voltage) * gain
+        self.frequency_offset += (nominal_frequency - frequency) * gain
+        return voltage, frequency
+
+    def step(self):
+        """Advance every node by one tick and return (voltage, frequency)"""
+        now = self.clock.time()
+        self._update_scenarios(now)
+
+        rows = (self.row_offset + self.tick) % len(self.dataset.replay)
+        base_voltage, base_frequency = self.dataset.sample_values(
+            self.scenario, self.clock.now().hour, rows, self.rng)
+        self.tick += 1
+
+        voltage, frequency = self._stabilize(now, base_voltage, base_frequency)
+        self.voltage, self.frequency = voltage, frequency
+
+        self.stability_score = 1.0 - (
+            np.abs(voltage - self.dataset.nominal_voltage) / 15 +
+            np.abs(frequency - self.dataset.nominal_frequency))
+
+        samples = np.concatenate([voltage, frequency])
+        self.window.append(samples)
+
+        if self.predictor is not None and self.window.full:
+            self._predict(samples)
+        return voltage, frequency
+
+    def windows(self):
+        """Ordered (2 * n_nodes, sequence_length) windows, voltages first"""
+        return self.window.view()
+
+    def _predict(self, samples):
+        # One streaming LSTM step covers all 2 * n_nodes streams; the predictor
+        # must be normalized per stream in the same voltages-first order
+        if self.predictor.stream_needs_warmup:
+            predictions = self.predictor.warm_stream(self.windows())
+        else:
+            predictions = self.predictor.predict_step(samples)
+        self.predicted_voltage = predictions[:self.n_nodes]
+        self.predicted_frequency = predictions[self.n_nodes:]
+
+    def out_of_tolerance(self):
+        """Boolean mask of nodes outside ControlLogic's tolerance bands"""
+        logic = self.control_logic
+        return ((np.abs(self.voltage - logic.nominal_voltage) > logic.voltage_tolerance) |
+                (np.abs(self.frequency - logic.nominal_frequency) > logic.frequency_tolerance))
+
+    def control_actions(self):
+        """Action codes and deviations for every node's predictions
+
+        Returns ((voltage codes, voltage deviations), (frequency codes,
+        frequency deviations)); render with ControlLogic.render_actions
+        only for the nodes actually sent to clients.
+        """
+        return (self.control_logic.get_voltage_actions(self.predicted_voltage),
+                self.control_logic.get_frequency_actions(self.predicted_frequency))
+
+    def destabilize(self, nodes):
+        """Knock back the learned stability of the given nodes"""
+        self.stabilization_quality[nodes] *= 1 - STABILITY_LOSS_RATE
+        self.last_destabilize_time[nodes] = self.clock.time()
+
+    def set_offsets(self, nodes, voltage_offset=None, frequency_offset=None):
+        """Apply manual offsets to the given nodes"""
+        if voltage_offset is not None:
+            self.voltage_offset[nodes] = voltage_offset
+        if frequency_offset is not None:
+            self.frequency_offset[nodes] = frequency_offset
+
+    def predictor_normalization(self):
+        """Per-stream loc and scale for an LSTMPredictor serving these nodes"""
+        logic = self.control_logic
+        loc = np.repeat([logic.nominal_voltage, logic.nominal_frequency], self.n_nodes)
+        scale = np.repeat([logic.voltage_tolerance, logic.frequency_tolerance],
+                          self.n_nodes)
+        return loc, scale
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+
+# Columns of the recorded microgrid data that the simulator replays
+REPLAY_COLUMNS = ('MG-LV-MSB_AC_Voltage', 'MG-LV-MSB_Frequency')
+CHUNK_ROWS = 250_000
+
+
+def default_cache_path(csv_path):
+    """Location of the columnar cache that sits next to the source CSV"""
+    root, _ = os.path.splitext(csv_path)
+    return root + '.replay.npy'
+
+
+def convert_csv(csv_path, cache_path, columns=REPLAY_COLUMNS, chunksize=CHUNK_ROWS):
+    """Convert the replayed CSV columns into a float32 columnar .npy file
+
+    The CSV is streamed in chunks so the whole month never has to sit in
+    memory. Each column is stored contiguously, giving a (columns, rows)
+    array that can later be memory-mapped.
+    """
+    import pandas as pd
+
+    tmp_paths = [f'{cache_path}.{i}.part' for i in range(len(columns))]
+    rows = 0
+    handles = [open(path, 'wb') for path in tmp_paths]
+    try:
+        for chunk in pd.read_csv(csv_path,
+                                 usecols=list(columns),
+                                 dtype={c: np.float32 for c in columns},
+                                 chunksize=chunksize):
+            for handle, column in zip(handles, columns):
+                chunk[column].to_numpy(dtype=np.float32).tofile(handle)
+            rows += len(chunk)
+    finally:
+        for handle in handles:
+            handle.close()
+
+    tmp_cache = cache_path + '.part'
+    out = np.lib.format.open_memmap(tmp_cache,
+                                    mode='w+',
+                                    dtype=np.float32,
+                                    shape=(len(columns), rows))
+    for i, path in enumerate(tmp_paths):
+        out[i] = np.memmap(path, dtype=np.float32, mode='r', shape=(rows,))
+    out.flush()
+    del out
+
+    # Atomic swap so a concurrently starting process never sees a partial file
+    os.replace(tmp_cache, cache_path)
+    for path in tmp_paths:
+        os.remove(path)
+
+
+class ReplayStore:
+    """Memory-mapped columnar replay of recorded measurements
+
+    Rows are served by a persistent cursor that wraps around at the end of
+    the recording, so every access is O(1) and reads straight from the
+    mapped pages without copying.
+    """
+
+    def __init__(self, csv_path, cache_path=None, columns=REPLAY_COLUMNS):
+        self.csv_path = csv_path
+        self.cache_path = cache_path or default_cache_path(csv_path)
+        self.columns = tuple(columns)
+
+        if self._is_stale():
+            convert_csv(self.csv_path, self.cache_path, self.columns)
+
+        self.data = np.load(self.cache_path, mmap_mode='r')
+        self.length = self.data.shape[1]
+        self.cursor = 0
+        self._views = [self.data[i] for i in range(len(self.columns))]
+
+    def _is_stale(self):
+        if not os.path.exists(self.cache_path):
+            return True
+        if (os.path.exists(self.csv_path) and os.path.getmtime(self.csv_path) >
+                os.path.getmtime(self.cache_path)):
+            return True
+        # Rebuild if the cache was written for a different set of columns
+        shape = np.load(self.cache_path, mmap_mode='r').shape
+        return shape[0] != len(self.columns)
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """Zero-copy view of a full column"""
+        return self.data[self.columns.index(name)]
+
+    def next_index(self):
+        """Return the current row index and advance the cursor"""
+        idx = self.cursor
+        self.cursor = (idx + 1) % self.length
+        return idx
+
+    def next_row(self):
+        """Return the values of the next row as a tuple of floats"""
+        idx = self.next_index()
+        return tuple(float(view[idx]) for view in self._views)
@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity sliding window backed by a NumPy array
+
+    Every value is written twice, at i and i + capacity, so each channel's
+    window in chronological order is always one contiguous slice: view()
+    never copies or shifts. Sums over the window are maintained on append,
+    giving O(1) mean, variance and trend. With channels, each of the
+    channels rows is its own window and the statistics are returned per
+    channel.
+    """
+
+    def __init__(self, capacity, channels=None, dtype=np.float64):
+        self.capacity = capacity
+        self.channels = channels
+        shape = (2 * capacity,) if channels is None else (channels, 2 * capacity)
+        self._data = np.zeros(shape, dtype=dtype)
+        self._start = 0
+        self._len = 0
+        self._appends = 0
+
+        # Sums of (value - reference), reference being the first value, which
+        # keeps the variance free of cancellation around e.g. 230 V
+        stat_shape = () if channels is None else (channels,)
+        self._reference = None
+        self._sum = np.zeros(stat_shape)
+        self._sum_sq = np.zeros(stat_shape)
+        self._sum_iv = np.zeros(stat_shape)  # Sum of position * value
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def full(self):
+        return self._len == self.capacity
+
+    def append(self, value):
+        """Add a value (one per channel), evicting the oldest when full"""
+        value = np.asarray(value, dtype=np.float64)
+        if self._reference is None:
+            self._reference = value.copy()
+        delta = value - self._reference
+
+        if self._len < self.capacity:
+            write = (self._start + self._len) % self.capacity
+            self._sum_iv += self._len * delta
+            self._len += 1
+        else:
+            write = self._start
+            evicted = self._data[..., write] - self._reference
+            self._sum -= evicted
+            self._sum_sq -= evicted * evicted
+            # Every remaining value moves one position towards the front
+            self._sum_iv -= self._sum
+            self._sum_iv += (self.capacity - 1) * delta
+            self._start = (write + 1) % self.capacity
+        self._sum += delta
+        self._sum_sq += delta * delta
+
+        self._data[..., write] = value
+        self._data[..., write + self.capacity] = value
+
+        # Recompute the sums once per capacity appends so rounding errors
+        # cannot accumulate; amortized this is still O(1)
+        self._appends += 1
+        if self._appends >= self.capacity:
+            self._resync()
+
+    def _resync(self):
+        self._appends = 0
+        delta = self.view() - self._reference[..., None]
+        self._sum = delta.sum(axis=-1)
+        self._sum_sq = (delta * delta).sum(axis=-1)
+        self._sum_iv = (delta * np.arange(self._len)).sum(axis=-1)
+
+    def view(self):
+        """Zero-copy contiguous view of the window, oldest value first"""
+        return self._data[..., self._start:self._start + self._len]
+
+    def latest(self):
+        return self._data[..., (self._start + self._len - 1) % self.capacity]
+
+    def mean(self):
+        return self._reference + self._sum / self._len
+
+    def variance(self):
+        """Population variance over the window"""
+        mean = self._sum / self._len
+        return np.maximum(self._sum_sq / self._len - mean * mean, 0.0)
+
+    def slope(self):
+        """Least-squares slope per step over the window"""
+        n = self._len
+        if n < 2:
+            return np.zeros_like(self._sum)
+        sum_i = n * (n - 1) / 2
+        sum_ii = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self._sum_iv - sum_i * self._sum) / (n * sum_ii - sum_i * sum_i)
+
+    def trend(self, span=10):
+        """Mean step-to-step change over the last span values
+
+        Equals np.mean(np.diff(window[-span:])) but only reads two values.
+        """
+        span = min(span, self._len)
+        if span < 2:
+            return np.zeros_like(self._sum)
+        end = self._start + self._len - 1
+        return (self._data[..., end] - self._data[..., end - span + 1]) / (span - 1)
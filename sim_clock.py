@@ -0,0 +1,35 @@
+import time
+from datetime import datetime
+
+
+class WallClock:
+    """Real-time clock used by the live dashboard"""
+
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated clock that jumps forward instead of sleeping
+
+    Lets the simulation run headless at full speed while every component
+    still sees a consistent notion of time.
+    """
+
+    def __init__(self, start=None):
+        self._time = (start or datetime.now()).timestamp()
+
+    def time(self):
+        return self._time
+
+    def now(self):
+        return datetime.fromtimestamp(self._time)
+
+    def sleep(self, seconds):
+        self._time += seconds
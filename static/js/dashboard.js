@@ -184,24 +184,52 @@ function showAnalysis() {
     updateSystemRecommendations();
 }
 
-// Update dashboard with new data
-socket.on('update_data', function(data) {
-    // Update voltage chart
-    if (voltageChart.data.datasets[0].data.length >= maxDataPoints) {
-        voltageChart.data.datasets[0].data.shift();
-        voltageData.shift();
+// Subscribe to the streams this dashboard shows; ?interval=N in the page
+// URL sets how many seconds the server coalesces updates for
+const updateInterval = Number(new URLSearchParams(window.location.search).get('interval')) || 1;
+const actionLabels = {};
+
+socket.on('connect', () => {
+    socket.emit('subscribe', {
+        nodes: [0],
+        metrics: ['voltage', 'frequency', 'predicted_voltage', 'predicted_frequency'],
+        interval: updateInterval
+    });
+});
+
+// Append a batch of samples and keep the last maxDataPoints
+function appendSamples(series, samples) {
+    return series.concat(samples).slice(-maxDataPoints);
+}
+
+// Update dashboard with a batch of packed updates
+socket.on('update_batch', function(batch) {
+    // values are float32 shaped (ticks, metrics, nodes), flattened
+    const values = new Float32Array(batch.values);
+    const stride = batch.metrics.length * batch.nodes.length;
+    const ticks = values.length / stride;
+    const column = (metric) => {
+        const offset = batch.metrics.indexOf(metric) * batch.nodes.length;
+        return Array.from({length: ticks}, (_, t) => values[t * stride + offset]);
+    };
+
+    // Labels only arrive when they change
+    for (const [name, perNode] of Object.entries(batch.labels)) {
+        actionLabels[name] = perNode['0'];
     }
-    voltageChart.data.datasets[0].data.push(data.voltage);
-    voltageData.push(data.voltage);
-    voltageChart.update();
 
-    // Update frequency chart
-    if (frequencyChart.data.datasets[0].data.length >= maxDataPoints) {
-        frequencyChart.data.datasets[0].data.shift();
-        frequencyData.shift();
+    const data = {};
+    for (const metric of batch.metrics) {
+        const series = column(metric);
+        data[metric] = series[series.length - 1];
+        if (metric === 'voltage') voltageData = appendSamples(voltageData, series);
+        if (metric === 'frequency') frequencyData = appendSamples(frequencyData, series);
     }
-    frequencyChart.data.datasets[0].data.push(data.frequency);
-    frequencyData.push(data.frequency);
+
+    // Redraw the charts once per batch
+    voltageChart.data.datasets[0].data = voltageData;
+    voltageChart.update();
+    frequencyChart.data.datasets[0].data = frequencyData;
     frequencyChart.update();
 
     // Update current values
@@ -216,14 +244,14 @@ socket.on('update_data', function(data) {
     const voltageAction = document.getElementById('voltageAction');
     const frequencyAction = document.getElementById('frequencyAction');
 
-    voltageAction.textContent = data.voltage_action;
-    frequencyAction.textContent = data.frequency_action;
-
-    console.log(data)
-
-    // Update action badges colors
-    updateActionBadge(voltageAction, data.voltage_action);
-    updateActionBadge(frequencyAction, data.frequency_action);
+    if (actionLabels.voltage_action !== undefined) {
+        voltageAction.textContent = actionLabels.voltage_action;
+        updateActionBadge(voltageAction, actionLabels.voltage_action);
+    }
+    if (actionLabels.frequency_action !== undefined) {
+        frequencyAction.textContent = actionLabels.frequency_action;
+        updateActionBadge(frequencyAction, actionLabels.frequency_action);
+    }
 
     // Update status indicators
     const [voltageStatusText, voltageStatusClass] = getVoltageStatus(data.voltage);
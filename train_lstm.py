@@ -0,0 +1,146 @@
+import argparse
+import logging
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import (Dataset, DataLoader, BatchSampler,
+                              RandomSampler, SequentialSampler)
+from grid_dataset import GridDataset
+from control_logic import ControlLogic
+from lstm_model import LSTM, save_checkpoint
+
+
+class WindowDataset(Dataset):
+    """Sliding (window, next value) pairs over one or more series
+
+    Windows are strided views into the series, so nothing is materialised
+    until a batch is gathered. Indexing with a list of indices returns a
+    whole batch at once, which is how window_loader drives it.
+    """
+
+    def __init__(self, series, sequence_length):
+        series = np.ascontiguousarray(series, dtype=np.float32)
+        self.windows = np.lib.stride_tricks.sliding_window_view(
+            series, sequence_length + 1, axis=-1)
+        self.per_series = self.windows.shape[1]
+
+    def __len__(self):
+        return self.windows.shape[0] * self.per_series
+
+    def __getitem__(self, idx):
+        series_idx, offset = np.divmod(np.asarray(idx), self.per_series)
+        batch = torch.from_numpy(self.windows[series_idx, offset])
+        return batch[..., :-1, None], batch[..., -1:]
+
+
+def window_loader(dataset, batch_size, shuffle=False, workers=0):
+    """DataLoader that fetches each batch with a single gather"""
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset,
+                      sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                      batch_size=None,
+                      num_workers=workers,
+                      persistent_workers=workers > 0)
+
+
+def build_series(dataset, control_logic, augment=1, seed=0):
+    """Normalized voltage and frequency series for training
+
+    Each pass replays the whole recording through generate_batch with a
+    different seed and start time, layering scenario noise on top. Values
+    are expressed in tolerances around nominal, matching the normalization
+    LSTMPredictor applies at inference time.
+    """
+    rng = np.random.default_rng(seed)
+    voltages, frequencies = [], []
+    for _ in range(augment):
+        start = np.datetime64('2023-04-01') + np.timedelta64(int(rng.integers(86400)), 's')
+        voltage, frequency, _ = dataset.generate_batch(len(dataset.replay),
+                                                       start_time=start.item(),
+                                                       seed=rng)
+        voltages.append(voltage)
+        frequencies.append(frequency)
+
+    voltage = (np.concatenate(voltages) -
+               control_logic.nominal_voltage) / control_logic.voltage_tolerance
+    frequency = (np.concatenate(frequencies) -
+                 control_logic.nominal_frequency) / control_logic.frequency_tolerance
+    return np.stack([voltage, frequency]).astype(np.float32)
+
+
+def evaluate(model, loader):
+    """Root mean squared error over a loader, in normalized units"""
+    model.eval()
+    squared_error, count = 0.0, 0
+    with torch.inference_mode():
+        for x, y in loader:
+            squared_error += ((model(x) - y) ** 2).sum().item()
+            count += y.numel()
+    return math.sqrt(squared_error / count)
+
+
+def train(series, sequence_length=10, epochs=5, batch_size=256,
+          learning_rate=1e-3, validation_split=0.1, workers=2):
+    """Train an LSTM on the series and return it with its validation RMSE"""
+    # Validate on the end of every series so windows never straddle the split
+    split = int(series.shape[1] * (1 - validation_split))
+    train_data = WindowDataset(series[:, :split], sequence_length)
+    val_data = WindowDataset(series[:, split:], sequence_length)
+
+    train_loader = window_loader(train_data, batch_size, shuffle=True,
+                                 workers=workers)
+    val_loader = window_loader(val_data, batch_size * 4, workers=workers)
+
+    model = LSTM()
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    criterion = nn.MSELoss()
+
+    best_rmse, best_state = math.inf, None
+    for epoch in range(epochs):
+        model.train()
+        for x, y in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(x), y)
+            loss.backward()
+            optimizer.step()
+
+        val_rmse = evaluate(model, val_loader)
+        logging.info(f'Epoch {epoch + 1}/{epochs}: validation RMSE {val_rmse:.4f}')
+        if val_rmse < best_rmse:
+            best_rmse = val_rmse
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+
+    model.load_state_dict(best_state)
+    model.eval()
+    return model, best_rmse
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the microgrid LSTM predictor')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--sequence-length', type=int, default=10)
+    parser.add_argument('--augment', type=int, default=1,
+                        help='scenario-augmented passes over the recording')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='DataLoader worker processes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    torch.manual_seed(args.seed)
+
+    series = build_series(GridDataset(), ControlLogic(), args.augment, args.seed)
+    model, val_rmse = train(series,
+                            sequence_length=args.sequence_length,
+                            epochs=args.epochs,
+                            batch_size=args.batch_size,
+                            learning_rate=args.learning_rate,
+                            workers=args.workers)
+
+    from app import create_app
+    with create_app().app_context():
+        record = save_checkpoint(model, val_rmse)
+        logging.info(f'Saved checkpoint {record.id} with validation RMSE {val_rmse:.4f}')